@@ -9,14 +9,104 @@ that trigger the package's installation. Uses emerge --pretend --verbose
 dependency variables to parse.
 
 Usage:
-    python rdep_analyze.py [emerge_rdeps.txt]
+    python rdep_analyze.py [-j JOBS | --jobs JOBS] [emerge_rdeps.txt]
 
 """
 
+import os
 import re
 import sys
+import array
+import argparse
+import collections
 import functools
+import itertools
+import threading
 import subprocess
+import concurrent.futures
+
+# A hyphen followed by a digit starts a version, not a package name. 
+_USENAME = r"[A-Za-z0-9][A-Za-z0-9+_@-]*"
+_PKGNAME = r"[A-Za-z0-9_](?:[A-Za-z0-9+_]|-(?![0-9]))*"
+_CATNAME = r"[A-Za-z0-9_][A-Za-z0-9+_.-]*"
+_SLOTNAME = _CATNAME
+_VERSION = r"-[0-9]+(?:\.[0-9]*)*\*?[A-Za-z]?(?:_[A-Za-z]+[0-9]*)*(?:-[A-Za-z][0-9]*)?"
+
+_PATS = {
+    "ws": re.compile(r"[ \t\n]+"),
+    "catchar": re.compile(r"[A-Za-z0-9+_.-]+"),
+    "usename": re.compile(_USENAME),
+    "pkgname": re.compile(_PKGNAME),
+    "catname": re.compile(_CATNAME),
+    "slotname": re.compile(_SLOTNAME),
+    "version": re.compile(_VERSION),
+}
+
+# The atom rule as one pattern, the named groups become its parcels. 
+_ATOM_PAT = re.compile(rf"""
+    (?P<Block>(?P<StrongBlock>!!)|(?P<SoftBlock>!))?
+    (?P<VersionGate>>=|<=|>|<|=|~)?
+    (?P<CatPkg>
+        (?P<CategoryName>{_CATNAME})/
+        (?P<PackageName>{_PKGNAME})?
+        |(?P<PackageNameOnly>{_PKGNAME})
+    )
+    (?P<Version>{_VERSION})?
+    (?P<Slot>:
+        (?:{_SLOTNAME})?
+        (?:/(?:{_SLOTNAME})?)?
+        [*=]?)?
+    (?P<UseDependencies>\[
+        (?:,?[-!]?{_USENAME}(?:\([+-]?\))?[=?]?)*
+    \])?
+    [ \t\n]*
+""", re.VERBOSE)
+
+# Atom parcel kinds in the order the parser emits them. 
+_ATOM_KINDS = (
+    ("StrongBlock", "StrongBlock"),
+    ("SoftBlock", "SoftBlock"),
+    ("Block", "Block"),
+    ("VersionGate", "VersionGate"),
+    ("CategoryName", "CategoryName"),
+    ("PackageName", "PackageName"),
+    ("PackageNameOnly", "PackageName"),
+    ("CatPkg", "CatPkg"),
+    ("Version", "Version"),
+    ("Slot", "Slot"),
+    ("UseDependencies", "UseDependencies"),
+)
+
+_LOWER = frozenset("abcdefghijklmnopqrstuvwxyz")
+_UPPER = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+_DIGITS = frozenset("1234567890")
+_WHITESPACE = frozenset(" \t\n")
+
+# Parcel kinds emitted for each character, inner parcels first. 
+_ALPHA_KINDS = {
+    **dict.fromkeys(_LOWER, ("AlphaLower", "Alpha")),
+    **dict.fromkeys(_UPPER, ("AlphaUpper", "Alpha")),
+}
+_ALPHADIG_KINDS = {
+    **{c: kinds + ("AlphaDig",) for c,kinds in _ALPHA_KINDS.items()},
+    **dict.fromkeys(_DIGITS, ("Digit", "AlphaDig")),
+}
+
+_CHARSETS = {}
+
+_CHECKPOINTS = array.array("i", bytes(256 * array.array("i").itemsize))
+
+_PARSERS = threading.local()
+
+_ALNUM = _LOWER | _UPPER | _DIGITS
+_ITEM_FIRST_CHARS = {
+    "all_of_group": frozenset("(") | _WHITESPACE,
+    "any_of_group": frozenset("|"),
+    "exactly_one_of_group": frozenset("^"),
+    "most_one_of_group": frozenset("?"),
+    "dynamic_use": frozenset("!") | _ALNUM,
+    "atom": frozenset("!<>=~_") | _ALNUM,
+}
 
 class Tree:
     """
@@ -25,11 +115,13 @@ class Tree:
 
     Provides methods for traversing branches and for printing the tree. 
     """
+    __slots__ = ("data", "_root", "_branches")
+    indent_inc = 2
+
     def __init__(self, data=None):
         self.data = data
         self._root = None
         self._branches = []
-        self.indent_inc = 2
 
     @property
     def branches(self):
@@ -39,6 +131,14 @@ class Tree:
         self._branches = [
             b for i,b in enumerate(self._branches) if not i in indices]
 
+    def keep_branches(self, func):
+        """
+        Keep only the branches for which func returns a truthy value, in a
+        single pass over the branches. 
+
+        """
+        self._branches = [b for b in self._branches if func(b)]
+
     def add_branch(self, tree):
         """
         Add a child branch and set its root reference.
@@ -47,14 +147,31 @@ class Tree:
         tree._root = self
         self._branches.append(tree)
 
+    def _render(self, num_indents, output):
+        """
+        Append the lines representing the tree and branch data to the output
+        list. 
+
+        """
+        # Branches are pushed in reverse so they are rendered in order. 
+        indents = {}
+        stack = [(self, num_indents)]
+        while stack:
+            tree, num_indents = stack.pop()
+            width = tree.indent_inc*num_indents
+            indent = indents.get(width)
+            if indent is None: indent = indents[width] = ' '*width
+            output.append(f"{indent}{tree.data}\n")
+            stack.extend((b, num_indents + 1) for b in reversed(tree.branches))
+
     def __repr__(self, num_indents=0):
         """
         Return string representation of recursive tree and branch data. 
 
         """
-        output = f"{' '*self.indent_inc*num_indents}{self.data}\n"
-        for b in self.branches:
-            output += b.__repr__(num_indents + 1)
+        output = []
+        self._render(num_indents, output)
+        output = "".join(output)
         if num_indents == 0: return output[:-1]
         return output
 
@@ -79,15 +196,28 @@ class Tree:
                 tree = trees[0]
             else:
                 raise ValueError("Ambiguous path, multiple options")
-            branches_by_value = {}
-            for branch in tree.branches:
-                branch_value = key_func(branch.data)
-                branches_by_value.setdefault(branch_value, []).append(branch)
-            trees = branches_by_value.get(value, [])
+            trees = [b for b in tree.branches if key_func(b.data) == value]
             if not trees:
                 return trees
         return trees
 
+    def group_branches(self, key_func):
+        """
+        Return a dictionary mapping the key_func value of each branch's data to
+        the list of branches with that value, in branch order. 
+
+        Equivalent to one traverse_branches([value], key_func) call per value,
+        with key_func applied once per branch. 
+
+        """
+        groups = {}
+        for b in self._branches:
+            key = key_func(b.data)
+            group = groups.get(key)
+            if group is None: groups[key] = [b]
+            else: group.append(b)
+        return groups
+
 
 class Parcel:
     """
@@ -95,6 +225,8 @@ class Parcel:
     value, and token type. 
 
     """
+    __slots__ = ("idx_start", "idx_end", "value", "kind")
+
     def __init__(self, idx_start, idx_end, value, kind):
         self.idx_start = idx_start
         self.idx_end = idx_end
@@ -106,6 +238,18 @@ class Parcel:
         f"({self.idx_start},{self.idx_end})"
     )
 
+    def __eq__(self, other):
+        if not isinstance(other, Parcel): return NotImplemented
+        return (
+            self.idx_start == other.idx_start and
+            self.idx_end == other.idx_end and
+            self.kind == other.kind and
+            self.value == other.value
+        )
+
+    # Pooled parcels are reused and changed, so they are not hashable. 
+    __hash__ = None
+
 
 class Parser:
     """
@@ -125,10 +269,78 @@ class Parser:
     """
     def __init__(self, depvar):
         self.depvar = depvar
+        self.depvar_len = len(depvar)
         self.parcels = []
+        # Only the parcel list built here is known to be sorted by end index. 
+        self._sorted_parcels = self.parcels
         self.idx = 0
         # Track previously successfully parsed indexes to use as reset points. 
-        self.checkpoints = []
+        self.checkpoints = _CHECKPOINTS[:]
+        self.checkpoint_depth = 0
+        self._parcel_pool = []
+        self._ver_gate_opts = (
+            self.gteq, self.lteq, self.gt, self.lt, self.eq, self.ax)
+        self._block_opts = (self.strong_block, self.soft_block)
+        self._soft_block_opts = (self.bang,)
+        self._strong_block_opts = (self.bang, self.bang)
+        self._gteq_opts = (self.gt, self.eq)
+        self._lteq_opts = (self.lt, self.eq)
+        self._use_name_opts = (self.use_name,)
+        self._useq_opts = (self.useq,)
+        self._use_query_opts = (self.use_query,)
+        self._cat_char_first_opts = (self.cat_char_first,)
+        self._catpkg_cat_opts = (self.cat_name, self.catpkg_delim)
+        self._slot_sep_opts = (self.slot_sep,)
+        self._subslot_sep_opts = (self.subslot_sep,)
+        self._use_default_open_opts = (self.use_default_open,)
+        self._use_default_close_opts = (self.use_default_close,)
+        self._use_dep_not_opts = (self.use_dep_not, self.use_dep_not_if)
+        self._use_dep_op_opts = (self.use_dep_eq, self.useq)
+        self._use_dep_opts = (self.use_dep,)
+        self._use_deps_open_opts = (self.use_deps_open,)
+        self._use_deps_close_opts = (self.use_deps_close,)
+        self._any_of_group_symbol_opts = (self.any_of_group_symbol,)
+        self._exactly_one_of_group_symbol_opts = (
+            self.exactly_one_of_group_symbol,)
+        self._most_one_of_group_symbol_opts = (self.most_one_of_group_symbol,)
+        self._dynamic_use_open_opts = (self.dynamic_use_open,)
+        self._dynamic_use_close_opts = (self.dynamic_use_close,)
+        self._group_open_opts = (self.group_open,)
+        self._group_close_opts = (self.group_close,)
+        self._group_item_opts = (
+            self.dynamic_use, 
+            self.all_of_group, 
+            self.any_of_group, 
+            self.exactly_one_of_group, 
+            self.most_one_of_group, 
+            self.atom
+        )
+        self._root_opts = (
+            self.all_of_group, 
+            self.any_of_group, 
+            self.exactly_one_of_group, 
+            self.most_one_of_group, 
+            self.dynamic_use, 
+            self.atom
+        )
+        self._group_item_dispatch = {}
+        self._root_dispatch = {}
+
+    def reset(self, depvar):
+        """
+        Start parsing a new dependency variable with this parser, keeping the
+        option tuples, dispatch tables and parcel pool built so far. 
+
+        Parcels parsed before the reset are left alone, so trees built from
+        them stay valid. 
+
+        """
+        self.depvar = depvar
+        self.depvar_len = len(depvar)
+        self.parcels = []
+        self._sorted_parcels = self.parcels
+        self.idx = 0
+        self.checkpoint_depth = 0
 
     def reset_to(self, idx=None):
         """
@@ -138,28 +350,98 @@ class Parser:
         """
         if idx is None: idx = self.idx
         self.idx = idx
-        self.parcels = [p for p in self.parcels if p.idx_end <= idx]
+        parcels = self.parcels
+        if parcels is self._sorted_parcels:
+            lo, hi = 0, len(parcels)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if parcels[mid].idx_end <= idx: lo = mid + 1
+                else: hi = mid
+            if lo == len(parcels): return
+            self._parcel_pool.extend(parcels[lo:])
+            del parcels[lo:]
+            return
+        # An assigned list may be shared, so its parcels are not pooled. 
+        self.parcels = [p for p in parcels if p.idx_end <= idx]
+
+    def make_parcel(self, idx_start, idx_end, value, kind):
+        """
+        Return a parcel with the given fields, reusing a pooled parcel if one
+        is available. 
+
+        """
+        if not self._parcel_pool:
+            return Parcel(idx_start, idx_end, value, kind)
+        parcel = self._parcel_pool.pop()
+        parcel.idx_start = idx_start
+        parcel.idx_end = idx_end
+        parcel.value = value
+        parcel.kind = kind
+        return parcel
 
     def __repr__(self):
         return self.to_tree().__repr__()
 
+    def scan(self, pattern):
+        """
+        Advance the cursor past the run of characters matched by the given
+        precompiled pattern at the cursor position. 
+
+        """
+        match = pattern.match(self.depvar, self.idx)
+        if match: self.idx = match.end()
+
+    def _skip_ws(self):
+        """
+        Advance the cursor past any whitespace without emitting a parcel. 
+
+        """
+        if self.depvar[self.idx:self.idx + 1] in _WHITESPACE:
+            self.scan(_PATS["ws"])
+
     def look(self, options):
         """
         Try the given options and advance the cursor if one of them matches. 
 
-        The options can be characters or functions. 
+        The options can be characters or functions. A string of characters or
+        only functions are handed to look_chars or look_rules. 
 
         """
+        if isinstance(options, str): return self.look_chars(options)
         idx_prev = self.idx
         for option in options:
             if callable(option): option()
             # Match end of string with None. 
-            elif self.idx >= len(self.depvar) and option is None: self.idx += 1
-            elif self.idx >= len(self.depvar): return False
+            elif self.idx >= self.depvar_len and option is None: self.idx += 1
+            elif self.idx >= self.depvar_len: return False
             elif self.depvar[self.idx] == option: self.idx += 1
             if self.idx > idx_prev: return True
         return False
 
+    def look_chars(self, chars):
+        """
+        Advance the cursor past the next character if it is one of the given
+        characters. 
+
+        """
+        idx = self.idx
+        if idx < self.depvar_len and self.depvar[idx] in chars:
+            self.idx = idx + 1
+            return True
+        return False
+
+    def look_rules(self, rules):
+        """
+        Call the given parsing functions in order until one of them advances
+        the cursor. 
+
+        """
+        idx_prev = self.idx
+        for rule in rules:
+            rule()
+            if self.idx > idx_prev: return True
+        return False
+
     def read(self, options=[], exceptions=[], count_max=1, require=False, idx_reset=None):
         """
         Advance the cursor while the maximum number of matches has not yet been
@@ -193,23 +475,99 @@ class Parser:
             if require is True: require = (None,None,)
             count_min, count_max = require
             if idx_reset is None: 
-                if self.checkpoints:
-                    idx_reset = self.checkpoints[-1]
+                if self.checkpoint_depth:
+                    idx_reset = self.checkpoints[self.checkpoint_depth - 1]
                 else:
                     idx_reset = self.idx
-            match_count = sum([self.look([option]) for option in options])
+            match_all = require==(None,None,)
+            num_options = len(options)
+            match_count = 0
+            for i,option in enumerate(options):
+                if callable(option): matched = self.look_rules((option,))
+                else: matched = self.look((option,))
+                if matched: match_count += 1
+                elif match_all: break
+                if count_max is not None and match_count > count_max: break
+                if count_min is not None and \
+                        match_count + num_options - i - 1 < count_min: break
             met = not any((
                 (count_min is not None and match_count < count_min),
                 (count_max is not None and match_count > count_max),
-                (require==(None,None,) and match_count != len(options))
+                (match_all and match_count != num_options)
             ))
             if not met: self.reset_to(idx_reset)
+        elif isinstance(options, str) and not exceptions:
+            chars = _CHARSETS.get(options)
+            if chars is None: chars = _CHARSETS[options] = frozenset(options)
+            depvar = self.depvar
+            idx = self.idx
+            idx_end = self.depvar_len
+            if count_max is not None: idx_end = min(idx_end, idx + count_max)
+            while idx < idx_end and depvar[idx] in chars: idx += 1
+            self.idx = idx
         else:
-            count_cur = 0
-            while count_max==None or count_cur<count_max:
-                if self.look(exceptions): self.idx = idx_prev; break
-                if not self.look(options): break
-                count_cur+= 1
+            kinds_by_char = None
+            if not exceptions: kinds_by_char = self._single_char_table(options)
+            if kinds_by_char is not None:
+                # Scan a run of one single character rule with its table. 
+                depvar = self.depvar
+                make_parcel = self.make_parcel if self._parcel_pool else Parcel
+                idx = self.idx
+                idx_end = self.depvar_len
+                if count_max is not None: idx_end = min(idx_end, idx + count_max)
+                run_end = idx
+                while run_end < idx_end and depvar[run_end] in kinds_by_char:
+                    run_end += 1
+                if run_end > idx:
+                    self.parcels.extend([
+                        make_parcel(i, i + 1, depvar[i], kind)
+                        for i in range(idx, run_end)
+                        for kind in kinds_by_char[depvar[i]]])
+                self.idx = run_end
+            else:
+                count_cur = 0
+                while count_max==None or count_cur<count_max:
+                    if exceptions and self.look(exceptions):
+                        # Parcels read by the exception are kept, unsorted. 
+                        self.idx = idx_prev
+                        self._sorted_parcels = None
+                        break
+                    if not self.look(options): break
+                    count_cur+= 1
+        return idx_prev < self.idx
+
+    def _single_char_table(self, options):
+        """
+        Return the character table of the single character rule all options
+        are bound to, or None if the options are anything else. 
+
+        """
+        if not options: return None
+        kinds_by_char = getattr(options[0], "kinds_by_char", None)
+        if kinds_by_char is None: return None
+        func = options[0].__func__
+        for option in options:
+            if getattr(option, "__func__", None) is not func: return None
+        return kinds_by_char
+
+    def read_items(self, options, dispatch, count_max=None):
+        """
+        Read dependency items like read(options, count_max=count_max), but only
+        try the options which can start at the next character. 
+
+        The dispatch dictionary caches the filtered options for each character.
+
+        """
+        idx_prev = self.idx
+        count_cur = 0
+        while count_max==None or count_cur<count_max:
+            char = self.depvar[self.idx:self.idx + 1]
+            candidates = dispatch.get(char)
+            if candidates is None:
+                candidates = dispatch[char] = tuple(
+                    o for o in options if char in _ITEM_FIRST_CHARS[o.__name__])
+            if not self.look_rules(candidates): break
+            count_cur+= 1
         return idx_prev < self.idx
 
     def reads(name):
@@ -220,42 +578,90 @@ class Parser:
         syntax. 
 
         """
+        if name: name = sys.intern(name)
         def decorator(func):
-            @functools.wraps(func)
             def wrapper(self, *args, **kwargs):
                 idx_prev = self.idx
-                self.checkpoints.append(idx_prev)
-                self.read(*args, options=[lambda: func(self)], **kwargs)
-                self.checkpoints.pop()
-                if idx_prev < self.idx and name: 
-                    text = self.depvar[idx_prev:self.idx]
-                    self.parcels.append(Parcel(idx_prev, self.idx, text, name))
+                checkpoints = self.checkpoints
+                depth = self.checkpoint_depth
+                if depth == len(checkpoints):
+                    checkpoints.extend(checkpoints)
+                checkpoints[depth] = idx_prev
+                self.checkpoint_depth = depth + 1
+                if args or kwargs:
+                    self.read(*args, options=[lambda: func(self)], **kwargs)
+                else:
+                    func(self)
+                self.checkpoint_depth = depth
+                idx = self.idx
+                if idx_prev < idx and name: 
+                    text = self.depvar[idx_prev:idx]
+                    self.parcels.append(
+                        self.make_parcel(idx_prev, idx, text, name))
+            wrapper.__name__ = func.__name__
+            wrapper.__qualname__ = func.__qualname__
+            wrapper.__doc__ = func.__doc__
             return wrapper
         return decorator
 
-    @reads("AlphaLower")
-    def lalpha(self): 
-        self.read("abcdefghijklmnopqrstuvwxyz")
-
-    @reads("AlphaUpper")
-    def ualpha(self): 
-        self.read("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+    def reads_char(name, chars):
+        """
+        Create a parsing function which reads a single character out of the
+        given characters and gives the token the given name. 
 
-    @reads("Digit")
-    def digit(self): 
-        self.read("1234567890")
+        Equivalent to a "reads" decorated function whose body is
+        self.read(chars), without going through read and look. 
 
-    @reads("Whitespace")
-    def whitespace(self): 
-        self.read("\n\t ")
+        """
+        name = sys.intern(name)
+        chars = frozenset(chars)
+        def reader(self):
+            idx = self.idx
+            if idx < self.depvar_len:
+                char = self.depvar[idx]
+                if char in chars:
+                    self.idx = idx + 1
+                    self.parcels.append(self.make_parcel(
+                        idx, idx + 1, char, name))
+        reader.kinds_by_char = dict.fromkeys(chars, (name,))
+        return reader
+
+    def reads_class(kinds_by_char, name=None):
+        """
+        Create a parsing function which reads a single character found in the
+        given dictionary and emits a parcel over it for each of the kinds the
+        dictionary maps it to. If a name is given, also read an underscore and
+        emit a parcel with that name over every character read. 
 
-    @reads("Alpha")
-    def alpha(self): 
-        self.read([self.lalpha, self.ualpha])
+        Equivalent to a "reads" decorated rule which only reads one character
+        through other single character rules, with one table lookup in place
+        of the nested read and look calls. 
 
-    @reads("AlphaDig")
-    def alphadig(self): 
-        self.read([self.alpha, self.digit])
+        """
+        if name is not None:
+            kinds_by_char = {
+                "_": (name,),
+                **{c: kinds + (name,) for c,kinds in kinds_by_char.items()}}
+        kinds_by_char = {
+            c: tuple(sys.intern(kind) for kind in kinds)
+            for c,kinds in kinds_by_char.items()}
+        def reader(self):
+            idx = self.idx
+            if idx < self.depvar_len:
+                char = self.depvar[idx]
+                kinds = kinds_by_char.get(char)
+                if kinds is not None:
+                    self.idx = idx + 1
+                    for kind in kinds:
+                        self.parcels.append(self.make_parcel(
+                            idx, idx + 1, char, kind))
+        reader.kinds_by_char = kinds_by_char
+        return reader
+
+    digit = reads_char("Digit", _DIGITS)
+
+    alpha = reads_class(_ALPHA_KINDS)
+    alphadig = reads_class(_ALPHADIG_KINDS)
 
     @reads("UseName")
     def use_name(self): 
@@ -270,46 +676,29 @@ class Parser:
         for LINGUAS.
 
         """
-        if not self.read([self.alphadig], require=True): return
-        self.read([self.alphadig, *"+_@-"], count_max=None)
-
-    @reads("!Use")
-    def use_not(self): 
-        self.read("!")
+        self.scan(_PATS["usename"])
 
-    @reads("Use?")
-    def useq(self): 
-        self.read("?")
+    use_not = reads_char("!Use", "!")
+    useq = reads_char("Use?", "?")
 
     @reads("UseQuery")
     def use_query(self):
         self.use_not()
-        if not self.read([self.use_name], require=True): return
-        if not self.read([self.useq], require=True): return
+        if not self.read(self._use_name_opts, require=True): return
+        if not self.read(self._useq_opts, require=True): return
 
-    @reads("gt")
-    def gt(self): 
-        self.read(">")
-
-    @reads("lt")
-    def lt(self): 
-        self.read("<")
-
-    @reads("eq")
-    def eq(self): 
-        self.read("=")
-
-    @reads("ax")
-    def ax(self): 
-        self.read("~")
+    gt = reads_char("gt", ">")
+    lt = reads_char("lt", "<")
+    eq = reads_char("eq", "=")
+    ax = reads_char("ax", "~")
 
     @reads("gteq")
     def gteq(self):
-        if not self.read([self.gt, self.eq], require=True): return
+        if not self.read(self._gteq_opts, require=True): return
 
     @reads("lteq")
     def lteq(self):
-        if not self.read([self.lt, self.eq], require=True): return
+        if not self.read(self._lteq_opts, require=True): return
 
     @reads("VersionGate")
     def ver_gate(self): 
@@ -331,19 +720,17 @@ class Parser:
         - > Strictly greater than the specified version.
 
         """
-        self.read([self.gteq, self.lteq, self.gt, self.lt, self.eq, self.ax])
+        self.read(self._ver_gate_opts)
 
-    @reads("Bang")
-    def bang(self): 
-        self.read("!")
+    bang = reads_char("Bang", "!")
 
     @reads("SoftBlock")
     def soft_block(self): 
-        self.read([self.bang])
+        self.read(self._soft_block_opts)
 
     @reads("StrongBlock")
     def strong_block(self): 
-        if not self.read([self.bang]*2, require=True): return
+        if not self.read(self._strong_block_opts, require=True): return
 
     @reads("Block")
     def block(self): 
@@ -361,65 +748,7 @@ class Parser:
         8.9.
 
         """
-        self.read([self.strong_block, self.soft_block])
-
-    @reads("VersionSep")
-    def ver_sep(self): 
-        self.read("-")
-
-    @reads("VersionMajor")
-    def ver_maj(self): 
-        self.read([self.digit], count_max=None)
-
-    @reads("VersionDelimiter")
-    def ver_del(self): 
-        self.read(".")
-        
-    @reads("VersionWildcard")
-    def ver_op(self): 
-        self.read("*")
-
-    @reads("VersionMinor")
-    def ver_min(self): 
-        if not self.read([self.ver_del], require=True): return
-        self.read([self.digit], count_max=None)
-
-    @reads("VersionNumber")
-    def ver_num(self):
-        if not self.read([self.ver_maj], require=True): return
-        self.read([self.ver_min], count_max=None)
-        self.ver_op()
-
-    @reads("VersionLetter")
-    def ver_letter(self): 
-        self.alpha()
-
-    @reads("VersionReleaseSep")
-    def ver_rel_sep(self): 
-        self.read("_")
-
-    @reads("VersionReleasePrefix")
-    def ver_rel_prefix(self): 
-        self.read([self.alpha], count_max=None)
-
-    @reads("VersionReleaseSuffix")
-    def ver_rel_suffix(self): 
-        self.read([self.digit], count_max=None)
-
-    @reads("VerEnd")
-    def ver_end(self): 
-        self.read([*")", self.whitespace, None])
-
-    @reads("VersionRelease")
-    def ver_release(self):
-        if not self.read(
-            [self.ver_rel_sep, self.ver_rel_prefix], require=True): return
-        self.ver_rel_suffix()
-
-    @reads("VersionRevision")
-    def ver_revision(self): 
-        if not self.read([self.ver_sep, self.alpha], require=True): return
-        self.read([self.digit], count_max=None)
+        self.read(self._block_opts)
 
     @reads("Version")
     def version(self):
@@ -448,20 +777,12 @@ class Parser:
 
         # EXTRA NOTE: the start of a version is marked with a dash '-'. 
 
-        """
-        if not self.read([self.ver_sep, self.ver_num], require=True): return
-        self.ver_letter()
-        self.read([self.ver_release], count_max=None)
-        self.ver_revision()
-        # if not self.read([self.ver_end], require=True): return
-
-    @reads("PkgChar")
-    def pkg_char(self): 
-        self.read([*"+_-", self.alphadig], [self.version])
+        # EXTRA NOTE: the version is matched as a whole like in the atom rule,
+        # the version component parcels are not emitted. 
 
-    @reads("PkgChar")
-    def pkg_char_first(self): 
-        self.read([*"_", self.alphadig])
+        """
+        match = _PATS["version"].match(self.depvar, self.idx)
+        if match: self.idx = match.end()
 
     @reads("PackageName")
     def pkg_name(self):
@@ -480,20 +801,15 @@ class Parser:
         # here. 
 
         """
-        if not self.read([self.pkg_char_first], require=True): return
-        self.read([self.pkg_char], count_max=None)
+        self.scan(_PATS["pkgname"])
 
-    @reads("CatPkgDelim")
-    def catpkg_delim(self): 
-        self.read("/")
+    catpkg_delim = reads_char("CatPkgDelim", "/")
 
-    @reads("CatChar")
-    def cat_char_first(self):
-        self.read([*"_", self.alphadig])
+    cat_char_first = reads_class(_ALPHADIG_KINDS, "CatChar")
 
     @reads("CatChar")
     def cat_char(self):
-        self.read([*"+_.-", self.alphadig])
+        self.scan(_PATS["catchar"])
 
     @reads("CategoryName")
     def cat_name(self): 
@@ -504,45 +820,33 @@ class Parser:
         must not begin with a hyphen, a dot or a plus sign.
 
         """
-        if not self.read([self.cat_char_first], require=True): return
-        self.read([self.cat_char], count_max=None)
+        if not self.read(self._cat_char_first_opts, require=True): return
+        self.cat_char()
 
     @reads("CatPkg")
     def catpkg(self):
         r"""
         """
-        self.read([self.cat_name, self.catpkg_delim], require=True)
+        # Only read a category which is followed by the delimiter. 
+        match = _PATS["catname"].match(self.depvar, self.idx)
+        if match and self.depvar.startswith("/", match.end()):
+            self.read(self._catpkg_cat_opts, require=True)
         self.pkg_name()
 
-    @reads("SlotSep")
-    def slot_sep(self): 
-        self.read(":")
+    slot_sep = reads_char("SlotSep", ":")
 
-    @reads("SlotChar")
-    def slot_char_first(self): 
-        self.read([*"_", self.alphadig])
-
-    @reads("SlotChar")
-    def slot_char(self): 
-        self.read([*"+_.-", self.alphadig])
-
-    @reads("SlotOp")
-    def slot_op(self): 
-        self.read("*=")
+    slot_op = reads_char("SlotOp", "*=")
 
     @reads("SlotBase")
     def slot_base(self): 
-        if not self.read([self.slot_char_first], require=True): return
-        self.read([self.slot_char], count_max=None)
+        self.scan(_PATS["slotname"])
 
-    @reads("SubslotSep")
-    def subslot_sep(self): 
-        self.read("/")
+    subslot_sep = reads_char("SubslotSep", "/")
 
     @reads("Subslot")
     def subslot(self):
         idx_prev = self.idx
-        if not self.read([self.subslot_sep], require=True): return
+        if not self.read(self._subslot_sep_opts, require=True): return
         self.slot_base()
 
     @reads("Slot")
@@ -591,36 +895,23 @@ class Parser:
         A slot name may contain any of the characters [A-Za-z0-9+_.-]. It must
         not begin with a hyphen, a dot or a plus sign.
         """
-        if not self.read([self.slot_sep], require=True): return
+        if not self.read(self._slot_sep_opts, require=True): return
         self.slot_base()
         self.subslot()
         self.slot_op()
 
-    @reads("UseDefaultOpen")
-    def use_default_open(self): 
-        self.read("(")
-
-    @reads("UseDefaultClose")
-    def use_default_close(self): 
-        self.read(")")
+    use_default_open = reads_char("UseDefaultOpen", "(")
+    use_default_close = reads_char("UseDefaultClose", ")")
 
     @reads("UseDefault")
     def use_default(self):
-        if not self.read([self.use_default_open], require=True): return
+        if not self.read(self._use_default_open_opts, require=True): return
         self.read("+-")
-        if not self.read([self.use_default_close], require=True): return
-
-    @reads("UseDependencySep")
-    def use_dep_sep(self): 
-        self.read(",")
-
-    @reads("UseDependencyNot")
-    def use_dep_not(self): 
-        self.read("-")
+        if not self.read(self._use_default_close_opts, require=True): return
 
-    @reads("UseDependencyNotIf")
-    def use_dep_not_if(self): 
-        self.read("!")
+    use_dep_sep = reads_char("UseDependencySep", ",")
+    use_dep_not = reads_char("UseDependencyNot", "-")
+    use_dep_not_if = reads_char("UseDependencyNotIf", "!")
 
     @reads("UseDependencyNot")
     def use_dep_eq(self): 
@@ -629,18 +920,13 @@ class Parser:
     @reads("UseDependency")
     def use_dep(self):
         self.use_dep_sep()
-        self.read([self.use_dep_not, self.use_dep_not_if], count_max=1)
-        if not self.read([self.use_name], require=True): return
+        self.read(self._use_dep_not_opts, count_max=1)
+        if not self.read(self._use_name_opts, require=True): return
         self.use_default()
-        self.read([self.use_dep_eq, self.useq], count_max=1)
-
-    @reads("UseDependencyOpen")
-    def use_deps_open(self): 
-        self.read("[")
+        self.read(self._use_dep_op_opts, count_max=1)
 
-    @reads("UseDependencyClose")
-    def use_deps_close(self):
-        self.read("]")
+    use_deps_open = reads_char("UseDependencyOpen", "[")
+    use_deps_close = reads_char("UseDependencyClose", "]")
 
     @reads("UseDependencies")
     def use_deps(self):
@@ -677,27 +963,34 @@ class Parser:
         IUSE_EFFECTIVE.
 
         """
-        if not self.read([self.use_deps_open], require=True): return
-        self.read([self.use_dep], count_max=None)
-        if not self.read([self.use_deps_close], require=True): return
+        if not self.read(self._use_deps_open_opts, require=True): return
+        self.read(self._use_dep_opts, count_max=None)
+        if not self.read(self._use_deps_close_opts, require=True): return
 
     @reads("Atom")
     def atom(self):
-        self.block()
-        self.ver_gate()
-        if not self.read([self.catpkg], require=True): return
-        self.version()
-        self.slot()
-        self.use_deps()
-        self.read([self.whitespace], count_max=None)
-
-    @reads("GroupOpen")
-    def group_open(self): 
-        self.read("(")
-
-    @reads("GroupClose")
-    def group_close(self): 
-        self.read(")")
+        r"""
+        Parse an atom made of an optional block, version gate, catpkg,
+        version, slot, use dependencies and trailing whitespace. 
+
+        The rules are matched at once with a single compiled pattern. Only the
+        parcels of the top level parts of the atom are emitted, not the
+        parcels of the characters within them. 
+
+        """
+        match = _ATOM_PAT.match(self.depvar, self.idx)
+        if not match: return
+        for group, kind in _ATOM_KINDS:
+            idx_start, idx_end = match.span(group)
+            if idx_start < idx_end:
+                value = self.depvar[idx_start:idx_end]
+                if kind == "CatPkg": value = sys.intern(value)
+                self.parcels.append(
+                    self.make_parcel(idx_start, idx_end, value, kind))
+        self.idx = match.end()
+
+    group_open = reads_char("GroupOpen", "(")
+    group_close = reads_char("GroupClose", ")")
 
     @reads("AllOfGroup")
     def all_of_group(self):
@@ -714,17 +1007,17 @@ class Parser:
         # here. 
 
         """
-        self.read([self.whitespace],count_max=None)
-        if not self.read([self.group_open], require=True): return
-        self.read([self.whitespace],count_max=None)
-        self.read([self.meta_group_item], count_max=None)
-        self.read([self.whitespace], count_max=None)
-        if not self.read([self.group_close], require=True): return
-        self.read([self.whitespace],count_max=None)
+        self._skip_ws()
+        if not self.read(self._group_open_opts, require=True): return
+        self._skip_ws()
+        self.read_items(self._group_item_opts, self._group_item_dispatch)
+        self._skip_ws()
+        if not self.read(self._group_close_opts, require=True): return
+        self._skip_ws()
         
     @reads("AnyOfGroupSymbol")
     def any_of_group_symbol(self): 
-        self.read([lambda: self.read("|")]*2, require=True)
+        self.read(("|", "|"), require=True)
 
     @reads("AnyOfGroup")
     def any_of_group(self):
@@ -742,18 +1035,18 @@ class Parser:
         # here. 
 
         """
-        if not self.read([self.any_of_group_symbol], require=True): return
-        self.read([self.whitespace],count_max=None)
-        if not self.read([self.group_open], require=True): return
-        self.read([self.whitespace],count_max=None)
-        self.read([self.meta_group_item], count_max=None)
-        self.read([self.whitespace],count_max=None)
-        if not self.read([self.group_close], require=True): return
-        self.read([self.whitespace],count_max=None)
+        if not self.read(self._any_of_group_symbol_opts, require=True): return
+        self._skip_ws()
+        if not self.read(self._group_open_opts, require=True): return
+        self._skip_ws()
+        self.read_items(self._group_item_opts, self._group_item_dispatch)
+        self._skip_ws()
+        if not self.read(self._group_close_opts, require=True): return
+        self._skip_ws()
 
     @reads("ExactlyOneOfGroupSymbol")
     def exactly_one_of_group_symbol(self): 
-        self.read([*"^^"], require=True)
+        self.read(("^", "^"), require=True)
 
     @reads("ExactlyOneOfGroup")
     def exactly_one_of_group(self):
@@ -767,19 +1060,19 @@ class Parser:
         # here. 
 
         """
-        if not self.read([self.exactly_one_of_group_symbol], require=True):
+        if not self.read(self._exactly_one_of_group_symbol_opts, require=True):
             return
-        self.read([self.whitespace],count_max=None)
-        if not self.read([self.group_open], require=True): return
-        self.read([self.whitespace],count_max=None)
-        self.read([self.meta_group_item], count_max=None)
-        self.read([self.whitespace],count_max=None)
-        if not self.read([self.group_close], require=True): return
-        self.read([self.whitespace],count_max=None)
+        self._skip_ws()
+        if not self.read(self._group_open_opts, require=True): return
+        self._skip_ws()
+        self.read_items(self._group_item_opts, self._group_item_dispatch)
+        self._skip_ws()
+        if not self.read(self._group_close_opts, require=True): return
+        self._skip_ws()
 
     @reads("MostOneOfGroupSymbol")
     def most_one_of_group_symbol(self): 
-        self.read([lambda: self.read("?")]*2, require=True)
+        self.read(("?", "?"), require=True)
 
     @reads("MostOneOfGroup")
     def most_one_of_group(self):
@@ -794,22 +1087,18 @@ class Parser:
         # here. 
 
         """
-        if not self.read([self.most_one_of_group_symbol], require=True): return
-        self.read([self.whitespace],count_max=None)
-        if not self.read([self.group_open], require=True): return
-        self.read([self.whitespace],count_max=None)
-        self.read([self.meta_group_item], count_max=None)
-        self.read([self.whitespace],count_max=None)
-        if not self.read([self.group_close], require=True): return
-        self.read([self.whitespace],count_max=None)
-
-    @reads("DynamicUseOpen")
-    def dynamic_use_open(self): 
-        self.read("(")
+        if not self.read(self._most_one_of_group_symbol_opts, require=True):
+            return
+        self._skip_ws()
+        if not self.read(self._group_open_opts, require=True): return
+        self._skip_ws()
+        self.read_items(self._group_item_opts, self._group_item_dispatch)
+        self._skip_ws()
+        if not self.read(self._group_close_opts, require=True): return
+        self._skip_ws()
 
-    @reads("DynamicUseClose")
-    def dynamic_use_close(self): 
-        self.read(")")
+    dynamic_use_open = reads_char("DynamicUseOpen", "(")
+    dynamic_use_close = reads_char("DynamicUseClose", ")")
 
     @reads("DynamicUse")
     def dynamic_use(self):
@@ -829,24 +1118,18 @@ class Parser:
         # here. 
 
         """
-        if not self.read([self.use_query], require=True): return
-        self.read([self.whitespace], count_max=None)
-        if not self.read([self.dynamic_use_open], require=True): return
-        self.read([self.whitespace], count_max=None)
-        self.read([self.meta_group_item], count_max=None)
-        self.read([self.whitespace], count_max=None)
-        if not self.read([self.dynamic_use_close], require=True): return
-        self.read([self.whitespace], count_max=None)
+        if not self.read(self._use_query_opts, require=True): return
+        self._skip_ws()
+        if not self.read(self._dynamic_use_open_opts, require=True): return
+        self._skip_ws()
+        self.read_items(self._group_item_opts, self._group_item_dispatch)
+        self._skip_ws()
+        if not self.read(self._dynamic_use_close_opts, require=True): return
+        self._skip_ws()
 
     def meta_group_item(self):
-        self.read([
-            self.dynamic_use, 
-            self.all_of_group, 
-            self.any_of_group, 
-            self.exactly_one_of_group, 
-            self.most_one_of_group, 
-            self.atom
-        ])
+        self.read_items(
+            self._group_item_opts, self._group_item_dispatch, count_max=1)
 
     @reads("Root")
     def root(self): 
@@ -854,40 +1137,99 @@ class Parser:
         Parse atom dependency list. 
 
         """
-        self.read([
-            self.all_of_group, 
-            self.any_of_group, 
-            self.exactly_one_of_group, 
-            self.most_one_of_group, 
-            self.dynamic_use, 
-            self.atom
-        ], count_max=None)
+        self.read_items(self._root_opts, self._root_dispatch)
+
+    def first_value(self, kind, default=""):
+        """
+        Return the value of the first emitted parcel of the given kind, or the
+        default if there is none. 
+
+        """
+        for parcel in self.parcels:
+            if parcel.kind == kind: return parcel.value
+        return default
+
+    def last_value(self, kind, default=""):
+        """
+        Return the value of the last emitted parcel of the given kind, or the
+        default if there is none. 
+
+        """
+        for parcel in reversed(self.parcels):
+            if parcel.kind == kind: return parcel.value
+        return default
 
     def to_tree(self):
         """
         Convert the list of parsed parcels to a tree and return that tree. 
 
         """
-        in_tree = lambda a,o: (
-            a.data.idx_start >= o.data.idx_start and \
-            a.data.idx_end <= o.data.idx_end)
-        trees = [Tree(parcel) for parcel in self.parcels]
-        trees.reverse()
-        trees.sort(key=lambda t: (t.data.idx_start, -t.data.idx_end))
+        # Parcels are emitted after their children, reversed so the outer one
+        # of two equal spans comes first in the stable sort. 
+        parcels = self.parcels[::-1]
+        idx_starts = [p.idx_start for p in parcels]
+        idx_ends = [p.idx_end for p in parcels]
+        span = max(idx_ends, default=0) + 1
+        keys = [s*span - e for s,e in zip(idx_starts, idx_ends)]
+        order = sorted(range(len(parcels)), key=keys.__getitem__)
         roots = []
+        # Once sorted, containment only depends on the ancestors' end indexes. 
         ancestry = []
-        for tree in trees:
-            while ancestry and not in_tree(tree, ancestry[-1]): ancestry.pop()
+        ancestry_ends = []
+        for i in order:
+            idx_end = idx_ends[i]
+            while ancestry_ends and idx_end > ancestry_ends[-1]:
+                ancestry_ends.pop()
+                ancestry.pop()
+            tree = Tree(parcels[i])
             if ancestry:
                 ancestry[-1].add_branch(tree)
             else:
                 roots.append(tree)
             ancestry.append(tree)
+            ancestry_ends.append(idx_end)
         if not roots:
             return Tree(Parcel(0,0,"",""))
         return roots[0]
 
 
+@functools.lru_cache(maxsize=4096)
+def parse_depvar(depvar):
+    """
+    Parse a dependency variable and return its syntax tree. 
+
+    Parsing only depends on the string, so results are cached. The same
+    dependency strings recur across packages and often between the depend
+    variables of one package. The returned tree is shared between callers and
+    must not be modified. 
+
+    """
+    parser = getattr(_PARSERS, "parser", None)
+    if parser is None: parser = _PARSERS.parser = Parser(depvar)
+    else: parser.reset(depvar)
+    parser.root()
+    return parser.to_tree()
+
+def parse_depvars(depvars, jobs=None, chunksize=64):
+    """
+    Parse several dependency variables and return a dictionary mapping each
+    dependency variable to its syntax tree. 
+
+    Parsing is CPU bound and each string is independent, so batches are
+    spread in chunks over a pool of jobs processes (defaults to the number of
+    CPUs). When only one process would do the work, the batch is parsed in
+    this process instead. 
+
+    """
+    depvars = list(dict.fromkeys(depvars))
+    num_chunks = -(-len(depvars) // chunksize)
+    if min(jobs or os.cpu_count() or 1, num_chunks) <= 1:
+        return {depvar: parse_depvar(depvar) for depvar in depvars}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        trees = pool.map(parse_depvar, depvars, chunksize=chunksize)
+        return dict(zip(depvars, trees))
+
+
 class Rdeps:
     """
     Provides a pipeline for parsing the dependency list given by the following
@@ -907,45 +1249,64 @@ class Rdeps:
 
     def _read_file(self, filepath):
         """
-        Read the file.
+        Read the file, returning an iterator over its lines. 
 
         """
         if not filepath:
             return
-        with open(filepath) as f:
-            text = f.read()
-        return text
+        return self._iter_file_lines(filepath)
+
+    def _iter_file_lines(self, filepath):
+        """
+        Yield the lines of the file without their newlines, so the file is
+        filtered as it is read instead of being loaded whole. 
+
+        """
+        with open(filepath, buffering=1<<20) as f:
+            for line in f:
+                yield line.rstrip("\n")
 
-    def _extract_lines(self, text):
+    def _extract_lines(self, lines):
         """
         Extract the relevant lines from the file.
 
         """
-        if text is None:
-            command = "emerge --pretend --verbose --emptytree --depclean"
+        if lines is None:
+            command = ["emerge", "--pretend", "--verbose", "--emptytree", "--depclean"]
             process = subprocess.Popen(
                 command, 
                 stdout=subprocess.PIPE, 
-                shell=True, 
-                text=True
+                text=True,
+                bufsize=1<<20
             )
-            stdout, stderr = process.communicate()
-            text = stdout
-        is_blank = lambda line: not line.strip()
-        lines = text.split("\n")
+            with process:
+                lines = (line.rstrip("\n") for line in process.stdout)
+                filtered_lines = self._filter_lines(lines)
+                # Drain the rest of the output so emerge can finish writing. 
+                for line in process.stdout: pass
+            return filtered_lines
+        return self._filter_lines(lines)
+
+    def _filter_lines(self, lines):
+        """
+        Return the lines between the "pulled in by:" line and the next line
+        starting with ">>>", leaving out blank lines. 
+
+        """
         start_token = "pulled in by:"
         end_token = ">>>"
-        start_flag = False
-        end_flag = False
 
-        filtered_lines = []
+        lines = iter(lines)
         for line in lines:
-            if not start_flag: start_flag = line.endswith(start_token)
-            if start_flag: end_flag = line.startswith(end_token)
-            else: continue
-            if end_flag: break
-            if is_blank(line): continue
-            filtered_lines.append(line)
+            if line.endswith(start_token): break
+        else:
+            return []
+
+        filtered_lines = []
+        append = filtered_lines.append
+        for line in itertools.chain((line,), lines):
+            if line.startswith(end_token): break
+            if line.strip(): append(line)
         return filtered_lines
 
     def _build_dependee_dict(self, lines):
@@ -954,21 +1315,21 @@ class Rdeps:
         depend on it. 
 
         """
-        dependees_by_dependency = {}
+        dependees_by_dependency = collections.defaultdict(list)
 
         parent_indent = 0
         parent_dependee_pkgname = ""
         for line in lines:
-            line_indent = len(line) - len(line.lstrip())
-            line_pkgname = line.strip().split(" ")[0]
+            stripped = line.lstrip()
+            line_indent = len(line) - len(stripped)
+            line_pkgname = sys.intern(stripped.rstrip().partition(" ")[0])
 
             if (not parent_indent) or (line_indent <= parent_indent):
                 parent_indent = line_indent
                 parent_pkgname = line_pkgname
             else: 
-                dependees_by_dependency.setdefault(parent_pkgname, [])
                 dependees_by_dependency[parent_pkgname].append(line_pkgname)
-        return dependees_by_dependency
+        return dict(dependees_by_dependency)
 
 class Colored:
     """
@@ -977,34 +1338,43 @@ class Colored:
 
     """
     # for i in {0..15}; do s="Hello, World!"; echo -e "\033[38;5;""$i""m""$s""\033[0m"; done;
+    colors = {
+        "black": 0,
+        "red": 1,
+        "green": 2,
+        "yellow": 3,
+        "blue": 4,
+        "magenta": 5,
+        "cyan": 6,
+        "white": 7,
+        "bright_black": 8,
+        "bright_red": 9,
+        "bright_green": 10,
+        "bright_yellow": 11,
+        "bright_blue": 12,
+        "bright_magenta": 13,
+        "bright_cyan": 14,
+        "bright_white": 15,
+    }
+    _prefixes = tuple(f"\033[38;5;{i}m" for i in range(256))
+    _reset = "\033[0m"
+
     def __init__(self, text, color):
         if isinstance(text, Colored):
             text = text.text
 
         if isinstance(color, str):
-            color = {
-                "black": 0,
-                "red": 1,
-                "green": 2,
-                "yellow": 3,
-                "blue": 4,
-                "magenta": 5,
-                "cyan": 6,
-                "white": 7,
-                "bright_black": 8,
-                "bright_red": 9,
-                "bright_green": 10,
-                "bright_yellow": 11,
-                "bright_blue": 12,
-                "bright_magenta": 13,
-                "bright_cyan": 14,
-                "bright_white": 15,
-            }[color]
+            color = self.colors[color]
         self.color = color
         self.text = text
+        if isinstance(color, int) and 0 <= color < len(self._prefixes):
+            prefix = self._prefixes[color]
+        else:
+            prefix = f"\033[38;5;{color}m"
+        self._rendered = f"{prefix}{text}{self._reset}"
 
     def __repr__(self):
-        return f"\033[38;5;{self.color}m{self.text}\033[0m"
+        return self._rendered
 
 class Triggers:
     """
@@ -1013,9 +1383,18 @@ class Triggers:
 
     """
     depvar_names="DEPEND RDEPEND BDEPEND IDEPEND PDEPEND"
-    def __init__(self, rdeps, use_full_atom=False, pkgname=None):
+    unlisted_groups = frozenset(("Root", "AllOfGroup"))
+    def __init__(self, rdeps, use_full_atom=False, pkgname=None, jobs=None):
         self.full_atom = use_full_atom
+        self.jobs = jobs
+        self._depvar_name_list = self.depvar_names.split(" ")
         self.dependees_by_dependency = rdeps.dependees_by_dependency
+        self._regex_cache = {}
+        self._match_cache = {}
+        self._atom_pkgname_cache = {}
+        self._depvars_cache = {}
+        self._trigger_cache = {}
+        self._render_cache = {}
         if pkgname is None:
             self.pkgname = self.prompt_pkgname()
 
@@ -1026,7 +1405,6 @@ class Triggers:
         options if input matches multiple pkgnames. 
 
         """
-        pkgnames = self.dependees_by_dependency.keys()
         if opts is None:
             opts = []
         elif opts:
@@ -1037,43 +1415,52 @@ class Triggers:
         for i,opt in enumerate(opts):
             print(i,opt)
         user_input = input(">>> ")
-        try:
-            user_regex = re.compile(user_input)
-        except re.error:
-            print("Invalid regex. Reprompting.")
-            return self.prompt_pkgname(opts)
+        user_regex = self._regex_cache.get(user_input)
+        if user_regex is None:
+            try:
+                user_regex = re.compile(user_input)
+            except re.error:
+                print("Invalid regex. Reprompting.")
+                return self.prompt_pkgname(opts)
+            self._regex_cache[user_input] = user_regex
 
         if opts and user_input.isdigit(): return list(opts)[int(user_input)]
         elif opts: return self.prompt_pkgname(opts)
 
-        for pkgname in pkgnames:
-            if user_regex.search(pkgname): opts.append(pkgname)
+        matches = self._match_cache.get(user_input)
+        if matches is None:
+            matches = self._match_cache[user_input] = sorted(
+                p for p in self.dependees_by_dependency if user_regex.search(p))
 
-        opts = sorted(list(opts))
+        opts = list(matches)
         if len(opts) == 1:
             return opts[0]
         return self.prompt_pkgname(opts)
 
-    def _calc_rdep_levels(
-            self, pkgname, _seen=None, _level=0):
+    def _calc_rdep_levels(self, pkgname):
         """
         Given a package name and a dictionary of dependees, generate tuples
         containing the level and name of each dependee for the given package name. 
 
         """
         atom_group_prefix = "@"
+        dependees_by_dependency = self.dependees_by_dependency
 
-        if _seen is None: _seen = []
-        yield (_level,pkgname,)
+        _seen = set()
+        yield (0,pkgname,)
 
-        for dependency_name in self.dependees_by_dependency.get(pkgname,[]):
+        # A dependee is checked against _seen only once it is reached. 
+        stack = [iter(dependees_by_dependency.get(pkgname,[]))]
+        while stack:
+            dependency_name = next(stack[-1], None)
+            if dependency_name is None:
+                stack.pop()
+                continue
             if dependency_name in _seen: continue
             if not dependency_name.startswith(atom_group_prefix):
-                _seen.append(dependency_name)
-            yield from self._calc_rdep_levels(
-                dependency_name,
-                _seen=_seen, 
-                _level=_level+1)
+                _seen.add(dependency_name)
+            yield (len(stack),dependency_name,)
+            stack.append(iter(dependees_by_dependency.get(dependency_name,[])))
 
     def _get_atom_pkgname(self, catpkg_text):
         """
@@ -1083,28 +1470,38 @@ class Triggers:
         """
         if catpkg_text.startswith("@"):
             return catpkg_text
-        x = lambda d: d.kind
-        parser = Parser(catpkg_text)
-        parser.root()
-        tree = parser.to_tree()
-        pkgname = tree.traverse_branches(
-            ["Atom", "CatPkg", 0], x)[0].data.value.strip()
+        pkgname = self._atom_pkgname_cache.get(catpkg_text)
+        if pkgname is not None:
+            return pkgname
+        match = _ATOM_PAT.match(catpkg_text)
+        if match and match.end() == len(catpkg_text):
+            pkgname = match.group("CatPkg").strip()
+        else:
+            x = lambda d: d.kind
+            tree = parse_depvar(catpkg_text)
+            pkgname = tree.traverse_branches(
+                ["Atom", "CatPkg", 0], x)[0].data.value.strip()
+        pkgname = sys.intern(pkgname)
+        self._atom_pkgname_cache[catpkg_text] = pkgname
         return pkgname
 
     def _get_depvars(self, pkgname):
         """
         Given a package name, search for that package's dependencies with
         portageq. Return a list of dependencies for each dependency type in the
-        self.depvar_names attribute. 
+        self.depvar_names attribute. Raise a RuntimeError with the error output
+        of portageq if it reports any. 
 
         """
-        command = f"portageq metadata / ebuild {pkgname} {self.depvar_names}"
-        process = subprocess.Popen(command, stderr=subprocess.PIPE, stdout=subprocess.PIPE, shell=True, text=True)
+        depvars = self._depvars_cache.get(pkgname)
+        if depvars is not None:
+            return depvars
+        command = ["portageq", "metadata", "/", "ebuild", pkgname, *self._depvar_name_list]
+        process = subprocess.Popen(command, stderr=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
         stdout, stderr = process.communicate()
-        if stderr:
-            print(stderr)
-            quit()
+        if stderr: raise RuntimeError(stderr)
         depvars = stdout.split("\n")
+        self._depvars_cache[pkgname] = depvars
         return depvars 
 
     def _make_trigger_tree(self, tree, triggers=None):
@@ -1118,7 +1515,6 @@ class Triggers:
 
         if triggers is None:
             triggers = Tree(("Root", tree.data.value.strip(),))
-        atoms = tree.traverse_branches(["Atom"], x)
 
         group_types = [
             "MostOneOfGroup",
@@ -1127,47 +1523,77 @@ class Triggers:
             "AllOfGroup",
         ]
 
-        for group in group_types:
-            for branch in tree.traverse_branches([group],x):
-                text = branch.data.value.strip()
-                b = Tree((group, text,))
-                triggers.add_branch(b)
-                self._make_trigger_tree(branch, b)
-
-        # Dynamic use statements must be handled differently than other groups.
-        for branch in tree.traverse_branches(["DynamicUse"],x):
-            use_query = branch.traverse_branches(["UseQuery"], x)
-            use_query = use_query[0].data.value
-            b = Tree(("DynamicUse", use_query))
-            triggers.add_branch(b)
-            self._make_trigger_tree(branch, b)
-
-        for branch in atoms:
-            if self.full_atom:
-                pkgname = branch.data.value
-            else:
-                pkgname = branch.traverse_branches(["CatPkg"], x)
-                pkgname = pkgname[0].data.value
-                pkgname = self._get_atom_pkgname(pkgname)
-            triggers.add_branch(Tree(("Pkgname", pkgname,)))
+        work = [(tree,triggers,)]
+        while work:
+            tree,trigger = work.pop()
+            branches_by_kind = tree.group_branches(x)
+            atoms = branches_by_kind.get("Atom", [])
+
+            for group in group_types:
+                for branch in branches_by_kind.get(group, []):
+                    text = branch.data.value.strip()
+                    b = Tree((group, text,))
+                    trigger.add_branch(b)
+                    work.append((branch,b,))
+
+            # Dynamic use statements must be handled differently than other groups.
+            for branch in branches_by_kind.get("DynamicUse", []):
+                use_query = branch.traverse_branches(["UseQuery"], x)
+                use_query = use_query[0].data.value
+                b = Tree(("DynamicUse", use_query))
+                trigger.add_branch(b)
+                work.append((branch,b,))
+
+            for branch in atoms:
+                if self.full_atom:
+                    pkgname = branch.data.value
+                else:
+                    pkgname = branch.traverse_branches(["CatPkg"], x)
+                    pkgname = pkgname[0].data.value
+                    pkgname = self._get_atom_pkgname(pkgname)
+                trigger.add_branch(Tree(("Pkgname", pkgname,)))
         return triggers
 
-    def _prune_trigger_tree(self, trigger_tree, pkgname):
+    def _collect_trigger_pkgnames(self, trigger_tree, pkgnames_under):
+        """
+        Given a trigger tree, map the id of every node in the tree to the set
+        of package names of the Pkgname nodes under it. Return the set for the
+        given tree. 
+
+        """
+        # Fill in the sets in reverse, so branches before their parents. 
+        nodes = []
+        work = [trigger_tree]
+        while work:
+            node = work.pop()
+            nodes.append(node)
+            work.extend(node.branches)
+        for node in reversed(nodes):
+            pkgnames = set()
+            for branch in node.branches:
+                pkgnames.update(pkgnames_under[id(branch)])
+            if node.data[0] == "Pkgname":
+                pkgnames.add(self._get_atom_pkgname(node.data[1]))
+            pkgnames_under[id(node)] = frozenset(pkgnames)
+        return pkgnames_under[id(trigger_tree)]
+
+    def _prune_trigger_tree(self, trigger_tree, pkgname, _pkgnames_under=None):
         """
         Given a trigger tree and a package name, remove all branches of the
         tree that do not end withq the package name. 
 
         """
-        ax = []
-        for i,branch in enumerate(trigger_tree.branches):
-            flag = self._prune_trigger_tree(branch, pkgname)
-            if not flag:
-                ax.append(i)
-        trigger_tree.remove_branches(ax)
-        if trigger_tree.data[0] == "Pkgname" and self._get_atom_pkgname(trigger_tree.data[1]) == pkgname:
-            return trigger_tree
-        if not trigger_tree.branches:
+        pkgnames_under = {}
+        if pkgname not in self._collect_trigger_pkgnames(
+                trigger_tree, pkgnames_under):
             return False
+
+        work = [trigger_tree]
+        while work:
+            node = work.pop()
+            node.keep_branches(
+                lambda branch: pkgname in pkgnames_under[id(branch)])
+            work.extend(node.branches)
         return trigger_tree
 
     def examine_dependencies(self):
@@ -1190,20 +1616,49 @@ class Triggers:
         trigger = Tree((level, pkgname,))
         yield(trigger)
 
+        # The portageq calls mostly wait on the subprocess, overlap them. 
+        pkgnames = list(dict.fromkeys(
+            pkgname for level,pkgname in rdep_levels
+            if not pkgname.startswith("@")))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            futures = [pool.submit(self._get_depvars, p) for p in pkgnames]
+            # Cancel the calls not started yet so only one error is reported. 
+            concurrent.futures.wait(
+                futures, return_when=concurrent.futures.FIRST_EXCEPTION)
+            for future in futures: future.cancel()
+        for future in futures:
+            if future.cancelled(): continue
+            error = future.exception()
+            if isinstance(error, RuntimeError):
+                print(error, file=sys.stderr)
+                sys.exit(1)
+            if error is not None: raise error
+        depvars_by_pkgname = {
+            pkgname: future.result()
+            for pkgname,future in zip(pkgnames, futures)}
+        # Every atom has a category, depvars without a "/" trigger nothing. 
+        trees_by_depvar = parse_depvars(
+            (d for depvars in depvars_by_pkgname.values() for d in depvars
+             if "/" in d),
+            jobs=self.jobs)
+
         for level,pkgname in rdep_levels:
             trigger = Tree((level,pkgname,))
             if pkgname.startswith("@"):
                 yield(trigger)
                 continue
 
-            pkg_depvars = self._get_depvars(pkgname)
+            pkg_depvars = depvars_by_pkgname[pkgname]
             ancestors[level] = self._get_atom_pkgname(pkgname)
-            for depend_var,depend_str in zip(self.depvar_names.split(" "),pkg_depvars):
-                parser = Parser(depend_str)
-                parser.root()
-                tree = parser.to_tree() 
-                triggers = self._make_trigger_tree(tree)
-                triggers = self._prune_trigger_tree(triggers, ancestors[level-1])
+            for depend_var,depend_str in zip(self._depvar_name_list,pkg_depvars):
+                if not "/" in depend_str: continue
+                key = (depend_str, ancestors[level-1])
+                triggers = self._trigger_cache.get(key)
+                if triggers is None:
+                    tree = trees_by_depvar[depend_str]
+                    triggers = self._make_trigger_tree(tree)
+                    triggers = self._prune_trigger_tree(triggers, ancestors[level-1])
+                    self._trigger_cache[key] = triggers
                 if not triggers: continue
                 trigger.add_branch(Tree((depend_var, triggers,)))
             yield(trigger)
@@ -1214,10 +1669,13 @@ class Triggers:
 
         """
         if lines is None: lines = []
-        if not trigger_tree.data[0] in ("Root", "AllOfGroup"):
-            lines.append((level,trigger_tree.data[1],))
-        for branch in trigger_tree.branches:
-            self.trigger_tree_to_lines(branch, lines=lines,level=level+1)
+        stack = [(level,trigger_tree,)]
+        while stack:
+            level,trigger_tree = stack.pop()
+            if not trigger_tree.data[0] in self.unlisted_groups:
+                lines.append((level,trigger_tree.data[1],))
+            stack.extend(
+                (level+1,branch,) for branch in reversed(trigger_tree.branches))
         return lines
 
     def repr_trigger(self, trigger):
@@ -1232,14 +1690,24 @@ class Triggers:
         else:
             pkgname = Colored(pkgname, 'yellow')
 
+        margin = ' '*indent*level
+        bullet = Colored('-','bright_black')
+        pads = {}
+
         lines = []
-        lines.append(f"{' '*indent*level}{pkgname}")
+        lines.append(f"{margin}{pkgname}")
         for branch in trigger.branches:
             depvar_name,trigger_tree = branch.data
-            trigger_lines = self.trigger_tree_to_lines(trigger_tree)
-            lines.append(f"{' '*indent*level}|  {Colored('-','bright_black')} {Colored(depvar_name,'bright_black')}:")
+            cached = self._render_cache.get(id(trigger_tree))
+            if cached is None:
+                cached = self._render_cache[id(trigger_tree)] = (
+                    trigger_tree, self.trigger_tree_to_lines(trigger_tree))
+            trigger_lines = cached[1]
+            lines.append(f"{margin}|  {bullet} {Colored(depvar_name,'bright_black')}:")
             for _level,trigger_line in trigger_lines:
-                lines.append(f"{' '*indent*level}|{' '*(indent*_level+4)}{trigger_line}")
+                pad = pads.get(_level)
+                if pad is None: pad = pads[_level] = f"{margin}|{' '*(indent*_level+4)}"
+                lines.append(f"{pad}{trigger_line}")
         return "\n".join(lines)
 
     def print(self):
@@ -1251,8 +1719,29 @@ class Triggers:
         for trigger in rdep_tree:
             print(self.repr_trigger(trigger))
 
+def _positive_int(text):
+    """
+    Argument type for counts which must be at least one. 
+
+    """
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {text!r}")
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: {text!r}")
+    return value
+
 def main():
-    filepath = "".join(sys.argv[1:2])
-    rdeps = Rdeps(filepath)
-    triggers = Triggers(rdeps)
+    arg_parser = argparse.ArgumentParser(prog="gentoo_rdep_analyzer")
+    arg_parser.add_argument(
+        "filepath", nargs="?", default="",
+        help="saved emerge output, emerge is run when not given")
+    arg_parser.add_argument(
+        "-j", "--jobs", type=_positive_int, default=None,
+        help="size of both the portageq thread pool and the parser process "
+        "pool")
+    args = arg_parser.parse_args()
+    rdeps = Rdeps(args.filepath)
+    triggers = Triggers(rdeps, jobs=args.jobs)
     triggers.print()
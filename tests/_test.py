@@ -1,7 +1,17 @@
 from gentoo_rdep_analyzer.rdep_analyzer import *
+import os
+import sys
+import time
+import functools
 import pytest
+import concurrent.futures
 from pytest import param
 
+# Shared so every call passes the same key function object. 
+def identity(x): return x
+
+def str_len(x): return str(len(x))
+
 def test_tree():
     level_lens = [10,10]
 
@@ -11,23 +21,21 @@ def test_tree():
             result+=arg*(10**i) 
         return result
 
-    def make_tree(level_lens, level, args, tree, output=None):
-        if output is None: output = [" "*tree.indent_inc*level+str(tree.data)]
-        if not level_lens: return tree
-        level += 1
-        args.append(None)
-        for i in range(level_lens[0]):
-            args[-1] = i
+    def make_tree(level_lens, tree):
+        # Children are pushed in reverse so they are built in order. 
+        prefixes = [" "*tree.indent_inc*level for level in range(len(level_lens)+1)]
+        output = [str(tree.data)]
+        stack = [(tree, (i,)) for i in reversed(range(level_lens[0]))]
+        while stack:
+            parent, args = stack.pop()
             data = data_func(*args)
             t = Tree(data)
-            output.append(" "*tree.indent_inc*level+str(data))
-            make_tree(
-                level_lens[1:], 
-                level, 
-                [i for i in args], 
-                t, 
-                output)
-            tree.add_branch(t)
+            parent.add_branch(t)
+            output.append(prefixes[len(args)]+str(data))
+            if len(args) < len(level_lens):
+                stack.extend(
+                    (t, args + (i,))
+                    for i in reversed(range(level_lens[len(args)])))
         return tree,output
 
     def check_branch_length(level_lens, tree):
@@ -36,7 +44,7 @@ def test_tree():
         for branch in tree.branches:
             check_branch_length(level_lens[1:], branch)
 
-    tree,output = make_tree(level_lens, 0, [], Tree())
+    tree,output = make_tree(level_lens, Tree())
     check_branch_length(level_lens, tree)
 
     tree_repr = tree.__repr__()
@@ -57,6 +65,20 @@ def test_tree_add_branch():
     assert branch in tree.branches
     assert branch._root is tree
 
+def test_tree_remove_branches():
+    tree = Tree()
+    for data in ["a", "b", "c", "d"]:
+        tree.add_branch(Tree(data))
+    tree.remove_branches({0, 2})
+    assert [b.data for b in tree.branches] == ["b", "d"]
+
+def test_tree_keep_branches():
+    tree = Tree()
+    for data in ["a", "b", "c", "d"]:
+        tree.add_branch(Tree(data))
+    tree.keep_branches(lambda b: b.data in "bd")
+    assert [b.data for b in tree.branches] == ["b", "d"]
+
 def test_tree_repr():
     tree = Tree()
     tree1 = Tree("tree1")
@@ -83,17 +105,60 @@ def test_tree_traverse():
             branch_2 = Tree(char)
             branch.add_branch(branch_2)
     # Select one from a list
-    branch = tree.traverse_branches(["one", 0], lambda x: x)
+    branch = tree.traverse_branches(["one", 0], identity)
     assert len(branch) == 1
     assert branch[0].data == "one"
     # Select a list
-    branch = tree.traverse_branches(["one"], lambda x: x)
+    branch = tree.traverse_branches(["one"], identity)
     assert len(branch) == 2
     # Select using more complex key function
-    branch = tree.traverse_branches(["5", 1], lambda x: str(len(x)))
+    branch = tree.traverse_branches(["5", 1], str_len)
     assert len(branch) == 1
     assert branch[0].data == "seven"
 
+def test_tree_group_branches():
+    tree = Tree()
+    for word in "one two three four five six seven".split(" "):
+        tree.add_branch(Tree(word))
+    groups = tree.group_branches(str_len)
+    assert list(groups) == ["3", "5", "4"]
+    for key, branches in groups.items():
+        assert branches == tree.traverse_branches([key], str_len)
+
+@pytest.fixture(scope="module")
+def parser_factory():
+    """
+    Return a function which resets one shared parser to a new dependency
+    variable, instead of building a parser for every parametrized case. 
+
+    """
+    parser = Parser("")
+    def make(depvar):
+        parser.reset(depvar)
+        return parser
+    return make
+
+def check_cases(cases, check):
+    """
+    Run the check on the values of every case, collecting the failures by
+    case id so one failing case does not hide the others. 
+
+    """
+    failures = []
+    for case in cases:
+        try:
+            check(*case.values)
+        except AssertionError as error:
+            failures.append(f"{case.id} {case.values!r}: {error}")
+    assert not failures, "\n".join(failures)
+
+def test_parcel_eq():
+    parcel = Parcel(0,3,"cat","CategoryName")
+    assert parcel == Parcel(0,3,"cat","CategoryName")
+    assert parcel != Parcel(0,3,"cat","PackageName")
+    assert parcel != Parcel(0,2,"ca","CategoryName")
+    assert parcel != "CategoryName: cat (0,3)"
+
 def test_parser_init():
     depvar = "category/atom"
     parser = Parser(depvar)
@@ -103,15 +168,48 @@ def test_parser_reset():
     depvar = "cat/pkg"
     parser = Parser(depvar)
     parser.catpkg()
+    key_func = lambda x: x.idx_end
     for i in range(len(depvar)):
         reset_point = len(depvar)-i
         parser.reset_to(reset_point)
-        key_func = lambda x: x.idx_end
         assert max(parser.parcels, key=key_func).idx_end <= reset_point
     parser.idx = 2
     parser.parcels = [Parcel(0,1,"c","test"), Parcel(1,3,"at","test")]
     parser.reset_to()
-    assert str(parser.parcels) == str([Parcel(0,1,"c","test")])
+    assert parser.parcels == [Parcel(0,1,"c","test")]
+
+def test_parser_reset_unsorted_parcels():
+    parser = Parser("abcde")
+    outer = Parcel(0,5,"abcde","X")
+    parser.parcels = [outer, Parcel(0,1,"a","Y")]
+    parser.idx = 2
+    parser.reset_to()
+    assert parser.parcels == [Parcel(0,1,"a","Y")]
+    # Parcels dropped from an assigned list are not reused for new ones. 
+    parser.alpha()
+    assert outer == Parcel(0,5,"abcde","X")
+
+def test_parser_reset_depvar():
+    parser = Parser("a/b-1")
+    parser.root()
+    parcels = parser.parcels
+    values = [p.value for p in parcels]
+    parser.reset("c/d")
+    assert parser.depvar == "c/d"
+    assert parser.idx == 0
+    assert parser.parcels == []
+    parser.root()
+    assert parser.first_value("CatPkg") == "c/d"
+    assert [p.value for p in parcels] == values
+
+def test_parser_reset_to_reparse():
+    parser = Parser(":slot/sub=")
+    parser.slot()
+    parcels = [str(p) for p in parser.parcels]
+    parser.reset_to(0)
+    parser.slot()
+    assert parser.idx == len(":slot/sub=")
+    assert [str(p) for p in parser.parcels] == parcels
 
 def test_parser_look_with_chars():
     depvar = "depvar"
@@ -135,6 +233,22 @@ def test_parser_look_with_funcs():
     assert parser.look([match]) == True
     assert parser.idx == 1
 
+def test_parser_look_chars():
+    parser = Parser("ab")
+    assert parser.look_chars("ba") == True
+    assert parser.look_chars("a") == False
+    assert parser.idx == 1
+    assert parser.look_chars("b") == True
+    assert parser.look_chars("b") == False
+    assert parser.idx == 2
+
+def test_parser_look_rules():
+    parser = Parser("a1")
+    assert parser.look_rules([parser.digit, parser.alpha]) == True
+    assert parser.idx == 1
+    assert parser.look_rules([parser.alpha]) == False
+    assert parser.idx == 1
+
 def test_parser_read_normal():
     depvar = "cat/pkg"
     parser = Parser(depvar)
@@ -188,7 +302,20 @@ def test_parser_reads():
     assert tree.data.kind == "Private"
     assert parser.idx == len(depvar)
 
-@pytest.mark.parametrize("depvar,expected",[
+@pytest.mark.parametrize("depvar,rule,expected",[
+    param("a", "alphadig", ["AlphaLower", "Alpha", "AlphaDig"], id="lower"),
+    param("1", "alphadig", ["Digit", "AlphaDig"], id="digit"),
+    param("_", "cat_char_first", ["CatChar"], id="underscore"),
+    param("Z", "cat_char_first", ["AlphaUpper", "Alpha", "AlphaDig", "CatChar"], id="upper"),
+    param("-", "cat_char_first", [], id="no match"),
+])
+def test_parser_reads_class(parser_factory, depvar, rule, expected):
+    parser = parser_factory(depvar)
+    getattr(parser, rule)()
+    assert [p.kind for p in parser.parcels] == expected
+    assert parser.idx == (1 if expected else 0)
+
+USENAME_CASES = [
     param("alpha","alpha", id="default"),
     param("ALPHA","ALPHA", id="upper"),
     param("cat10","cat10", id="end with number"),
@@ -202,8 +329,9 @@ def test_parser_reads():
     param("+at","", id="cannot start with + symbol"),
     param("@at","", id="cannot start with @ symbol"),
     param("*at","", id="cannot contain other symbol"),
-])
-def test_parser_usename(depvar, expected):
+]
+
+def test_parser_usename(parser_factory):
     r"""
     3.1.4 USE flag names
 
@@ -215,12 +343,14 @@ def test_parser_usename(depvar, expected):
     for LINGUAS.
 
     """
-    parser = Parser(depvar)
-    parser.use_name()
-    value = next((p.value for p in parser.parcels if p.kind=="UseName"), "")
-    assert value == expected
-
-@pytest.mark.parametrize("depvar,expected",[
+    def check(depvar, expected):
+        parser = parser_factory(depvar)
+        parser.use_name()
+        value = parser.first_value("UseName")
+        assert value == expected
+    check_cases(USENAME_CASES, check)
+
+VERGATE_CASES = [
     param("<","<", id="less than"),
     param("<=","<=", id="less than or equal to"),
     param("=","=", id="equal to"),
@@ -228,8 +358,9 @@ def test_parser_usename(depvar, expected):
     param(">=",">=", id="greater than or equal to"),
     param(">",">", id="greater than"),
     param("*","", id="illegal version operator"),
-])
-def test_parser_vergate(depvar, expected):
+]
+
+def test_parser_vergate(parser_factory):
     r"""
     8.3.1 Operators
 
@@ -248,17 +379,20 @@ def test_parser_vergate(depvar, expected):
     - > Strictly greater than the specified version.
 
     """
-    parser = Parser(depvar)
-    parser.ver_gate()
-    value = next((p.value for p in parser.parcels if p.kind == "VersionGate"),"")
-    assert value == expected
+    def check(depvar, expected):
+        parser = parser_factory(depvar)
+        parser.ver_gate()
+        value = parser.first_value("VersionGate")
+        assert value == expected
+    check_cases(VERGATE_CASES, check)
 
 
-@pytest.mark.parametrize("depvar,expected,subkind",[
+BLOCK_CASES = [
     param("!", "!", "SoftBlock", id="soft block"),
     param("!!", "!!", "StrongBlock", id="strong block"),
-])
-def test_parser_block(depvar, expected, subkind):
+]
+
+def test_parser_block(parser_factory):
     r"""
     8.3.2 Block operator
 
@@ -273,17 +407,19 @@ def test_parser_block(depvar, expected, subkind):
     8.9.
 
     """
-    parser = Parser(depvar)
-    parser.block()
-    value = next((p.value for p in parser.parcels if p.kind == "Block"),"")
-    assert value == expected
-
-    soft_block = [p for p in parser.parcels if p.kind == "SoftBlock"]
-    strong_block = [p for p in parser.parcels if p.kind == "StrongBlock"]
-    assert len(soft_block) == int(subkind == "SoftBlock")
-    assert len(strong_block) == int(subkind == "StrongBlock")
-
-@pytest.mark.parametrize("depvar,expected",[
+    def check(depvar, expected, subkind):
+        parser = parser_factory(depvar)
+        parser.block()
+        value = parser.first_value("Block")
+        assert value == expected
+
+        soft_block = [p for p in parser.parcels if p.kind == "SoftBlock"]
+        strong_block = [p for p in parser.parcels if p.kind == "StrongBlock"]
+        assert len(soft_block) == int(subkind == "SoftBlock")
+        assert len(strong_block) == int(subkind == "StrongBlock")
+    check_cases(BLOCK_CASES, check)
+
+VERSION_CASES = [
     param("-","", id="must not match single hyphen"),
     param("-1","-1", id="major version"),
     param("-1.0","-1.0", id="minor version"),
@@ -298,8 +434,9 @@ def test_parser_block(depvar, expected, subkind):
     param("-1_xyz","-1_xyz", id="non standard suffixes accepted here"),
     param("-1-r","-1-r", id="revision"),
     param("-1-r1","-1-r1", id="revision with number"),
-])
-def test_parser_version(depvar, expected):
+]
+
+def test_parser_version(parser_factory):
     r"""
     3.2 Version Specifications
 
@@ -326,12 +463,14 @@ def test_parser_version(depvar, expected):
     # EXTRA NOTE: the start of a version is marked with a dash '-'. 
 
     """
-    parser = Parser(depvar)
-    parser.version()
-    value = next((p.value for p in parser.parcels if p.kind == "Version"),"")
-    assert value == expected
-
-@pytest.mark.parametrize("depvar,expected",[
+    def check(depvar, expected):
+        parser = parser_factory(depvar)
+        parser.version()
+        value = parser.first_value("Version")
+        assert value == expected
+    check_cases(VERSION_CASES, check)
+
+PKGNAME_CASES = [
     param("alpha","alpha", id="default"),
     param("ALPHA","ALPHA", id="upper"),
     param("pkg10","pkg10", id="end with number"),
@@ -346,8 +485,9 @@ def test_parser_version(depvar, expected):
     param("*kg","", id="cannot contain other symbol"),
     param("pkg-","pkg-", id="end with hyphen only"),
     param("pkg-1.0","pkg", id="end with version"),
-])
-def test_parser_pkgname(depvar, expected):
+]
+
+def test_parser_pkgname(parser_factory):
     r"""
     3.1.2 Package names
 
@@ -363,12 +503,14 @@ def test_parser_pkgname(depvar, expected):
     # here. 
 
     """
-    parser = Parser(depvar)
-    parser.pkg_name()
-    value = next((p.value for p in parser.parcels if p.kind=="PackageName"), "")
-    assert value == expected
-
-@pytest.mark.parametrize("depvar,expected",[
+    def check(depvar, expected):
+        parser = parser_factory(depvar)
+        parser.pkg_name()
+        value = parser.first_value("PackageName")
+        assert value == expected
+    check_cases(PKGNAME_CASES, check)
+
+CATNAME_CASES = [
     param("alpha","alpha", id="default"),
     param("ALPHA","ALPHA", id="upper"),
     param("cat10","cat10", id="end with number"),
@@ -383,8 +525,9 @@ def test_parser_pkgname(depvar, expected):
     param(".at","", id="cannot start with . symbol"),
     param("+at","", id="cannot start with + symbol"),
     param("*at","", id="cannot contain other symbol"),
-])
-def test_parser_catname(depvar, expected):
+]
+
+def test_parser_catname(parser_factory):
     r"""
     3.1.1 Category names
 
@@ -392,12 +535,30 @@ def test_parser_catname(depvar, expected):
     must not begin with a hyphen, a dot or a plus sign.
 
     """
-    parser = Parser(depvar)
-    parser.cat_name()
-    value = next((p.value for p in parser.parcels if p.kind=="CategoryName"), "")
-    assert value == expected
-
-@pytest.mark.parametrize("depvar,expected",[
+    def check(depvar, expected):
+        parser = parser_factory(depvar)
+        parser.cat_name()
+        value = parser.first_value("CategoryName")
+        assert value == expected
+    check_cases(CATNAME_CASES, check)
+
+CATPKG_CASES = [
+    param("cat/pkg","cat/pkg","cat", id="default"),
+    param("c.t-1/pkg-1.0","c.t-1/pkg","c.t-1", id="stops before version"),
+    param("pkg-1.0","pkg","", id="category not required"),
+    param("c:t/pkg","c","", id="category must end with delimiter"),
+    param("cat/","cat/","cat", id="package not required after category"),
+]
+
+def test_parser_catpkg(parser_factory):
+    def check(depvar, expected, category):
+        parser = parser_factory(depvar)
+        parser.catpkg()
+        assert parser.first_value("CatPkg") == expected
+        assert parser.first_value("CategoryName") == category
+    check_cases(CATPKG_CASES, check)
+
+SLOT_CASES = [
     param("slot","", id="no colon"),
     param(":slot",":slot", id="default"),
     param(":slot/sub",":slot/sub", id="subslot"),
@@ -413,8 +574,9 @@ def test_parser_catname(depvar, expected):
     param(":_slot",":_slot", id="can begin with _"),
     param(":10slot",":10slot", id="can begin with numbers"),
 
-])
-def test_parser_slot(depvar, expected):
+]
+
+def test_parser_slot(parser_factory):
     r"""
     8.3.3 Slot dependencies
 
@@ -460,13 +622,15 @@ def test_parser_slot(depvar, expected):
     not begin with a hyphen, a dot or a plus sign.
 
     """
-    parser = Parser(depvar)
-    parser.slot()
-    value = next((p.value for p in parser.parcels if p.kind=="Slot"), "")
-    assert value == expected
+    def check(depvar, expected):
+        parser = parser_factory(depvar)
+        parser.slot()
+        value = parser.first_value("Slot")
+        assert value == expected
+    check_cases(SLOT_CASES, check)
 
 
-@pytest.mark.parametrize("depvar,expected",[
+USEDEPENDENCIES_CASES = [
     param("[use]","[use]", id="default"),
     param("[]","[]", id="empty"),
     param("[opt=]","[opt=]", id="equals operator"),
@@ -486,8 +650,9 @@ def test_parser_slot(depvar, expected):
     param("[!opt(++)?]","", id="multiple defaults not allowed"),
     param("[!opt?(+)]","", id="default must come before operator"),
     param("[opt!]","", id="! is not a valid suffix"),
-])
-def test_parser_usedependencies(depvar, expected):
+]
+
+def test_parser_usedependencies(parser_factory):
     r"""
     8.3.4 2-style and 4-style USE dependencies
 
@@ -520,23 +685,41 @@ def test_parser_usedependencies(depvar, expected):
     IUSE_EFFECTIVE.
 
     """
-    parser = Parser(depvar)
-    parser.use_deps()
-    value = next((p.value for p in parser.parcels if p.kind=="UseDependencies"), "")
-    assert value == expected
+    def check(depvar, expected):
+        parser = parser_factory(depvar)
+        parser.use_deps()
+        value = parser.first_value("UseDependencies")
+        assert value == expected
+    check_cases(USEDEPENDENCIES_CASES, check)
 
 
+@functools.lru_cache(maxsize=64)
+def atom_value(depvar):
+    """
+    Return the value of the atom parsed from the dependency variable. Cached
+    so an atom checked again in the same session is not parsed again. 
+
+    """
+    parser = Parser(depvar)
+    parser.atom()
+    return parser.first_value("Atom")
+
 @pytest.mark.parametrize("depvar,expected",[
     param(
         "!!>=c-t/pkg-1.22.333a_alpha1-r42:_slot/_sub[!opt?,opt,-use(+),use(-)=]",
         "!!>=c-t/pkg-1.22.333a_alpha1-r42:_slot/_sub[!opt?,opt,-use(+),use(-)=]", 
         id="complex example"),
+    param("cat/pkg","cat/pkg", id="catpkg only"),
+    param("pkg","pkg", id="category not required"),
+    param("cat/","cat/", id="package not required after category"),
+    param("a/b-1.0 c/d","a/b-1.0 ", id="stops after trailing whitespace"),
+    param("!a/b:=","!a/b:=", id="block with slot operator"),
+    param("=a/b-1.2*","=a/b-1.2*", id="version wildcard"),
+    param("a/b[use,]","a/b", id="invalid use dependencies not consumed"),
+    param("||","", id="not an atom"),
 ])
 def test_parser_atom(depvar, expected):
-    parser = Parser(depvar)
-    parser.atom()
-    value = next((p.value for p in parser.parcels if p.kind=="Atom"), "")
-    assert value == expected
+    assert atom_value(depvar) == expected
 
 
 @pytest.mark.parametrize("depvar,expected",[
@@ -546,7 +729,7 @@ def test_parser_atom(depvar, expected):
     param("(atom pkg)","(atom pkg)", id="multiple"),
     param("(atom[-use(+)=] pkg-1.0[use(-)?])","(atom[-use(+)=] pkg-1.0[use(-)?])", id="complex atoms"),
 ])
-def test_parser_allgroup(depvar, expected):
+def test_parser_allgroup(parser_factory, depvar, expected):
     r"""
     8.2 Dependency Specification Format
 
@@ -560,9 +743,9 @@ def test_parser_allgroup(depvar, expected):
     # here. 
 
     """
-    parser = Parser(depvar)
+    parser = parser_factory(depvar)
     parser.all_of_group()
-    value = next((p.value for p in parser.parcels if p.kind=="AllOfGroup"), "")
+    value = parser.first_value("AllOfGroup")
     assert value == expected
 
 @pytest.mark.parametrize("depvar,expected",[
@@ -573,7 +756,7 @@ def test_parser_allgroup(depvar, expected):
     param("|| (atom pkg)","|| (atom pkg)", id="multiple"),
     param("|| (atom[-use(+)=] pkg-1.0[use(-)?])","|| (atom[-use(+)=] pkg-1.0[use(-)?])", id="complex atoms"),
 ])
-def test_parser_anygroup(depvar, expected):
+def test_parser_anygroup(parser_factory, depvar, expected):
     r"""
     8.2 Dependency Specification Format
 
@@ -588,9 +771,9 @@ def test_parser_anygroup(depvar, expected):
     # here. 
 
     """
-    parser = Parser(depvar)
+    parser = parser_factory(depvar)
     parser.any_of_group()
-    value = next((p.value for p in parser.parcels if p.kind=="AnyOfGroup"), "")
+    value = parser.first_value("AnyOfGroup")
     assert value == expected
 
 @pytest.mark.parametrize("depvar,expected",[
@@ -601,7 +784,7 @@ def test_parser_anygroup(depvar, expected):
     param("^^ (atom pkg)","^^ (atom pkg)", id="multiple"),
     param("^^ (atom[-use(+)=] pkg-1.0[use(-)?])","^^ (atom[-use(+)=] pkg-1.0[use(-)?])", id="complex atoms"),
 ])
-def test_parser_onegroup(depvar, expected):
+def test_parser_onegroup(parser_factory, depvar, expected):
     r"""
     8.2 Dependency Specification Format
 
@@ -612,9 +795,9 @@ def test_parser_onegroup(depvar, expected):
     # here. 
 
     """
-    parser = Parser(depvar)
+    parser = parser_factory(depvar)
     parser.exactly_one_of_group()
-    value = next((p.value for p in parser.parcels if p.kind=="ExactlyOneOfGroup"), "")
+    value = parser.first_value("ExactlyOneOfGroup")
     assert value == expected
 
 @pytest.mark.parametrize("depvar,expected",[
@@ -625,7 +808,7 @@ def test_parser_onegroup(depvar, expected):
     param("?? (atom pkg)","?? (atom pkg)", id="multiple"),
     param("?? (atom[-use(+)=] pkg-1.0[use(-)?])","?? (atom[-use(+)=] pkg-1.0[use(-)?])", id="complex atoms"),
 ])
-def test_parser_mostonegroup(depvar, expected):
+def test_parser_mostonegroup(parser_factory, depvar, expected):
     r"""
     8.2 Dependency Specification Format
 
@@ -637,9 +820,9 @@ def test_parser_mostonegroup(depvar, expected):
     # here. 
 
     """
-    parser = Parser(depvar)
+    parser = parser_factory(depvar)
     parser.most_one_of_group()
-    value = next((p.value for p in parser.parcels if p.kind=="MostOneOfGroup"), "")
+    value = parser.first_value("MostOneOfGroup")
     assert value == expected
 
 @pytest.mark.parametrize("depvar,expected",[
@@ -650,7 +833,7 @@ def test_parser_mostonegroup(depvar, expected):
     param("use? (cat/pkg atom)","use? (cat/pkg atom)", id="multiple atoms"),
     param("use? (cat/pkg use2? (atom))","use? (cat/pkg use2? (atom))", id="nested use"),
 ])
-def test_parser_dynamicuse(depvar, expected):
+def test_parser_dynamicuse(parser_factory, depvar, expected):
     r"""
     8.2 Dependency Specification Format
 
@@ -666,7 +849,133 @@ def test_parser_dynamicuse(depvar, expected):
     # here. 
 
     """
-    parser = Parser(depvar)
+    parser = parser_factory(depvar)
     parser.dynamic_use()
-    value = next(reversed(list(p.value for p in parser.parcels if p.kind=="DynamicUse")), "")
+    value = parser.last_value("DynamicUse")
     assert value == expected
+
+ITEM_KINDS = {
+    "AllOfGroup", "AnyOfGroup", "ExactlyOneOfGroup", "MostOneOfGroup",
+    "DynamicUse", "Atom"}
+
+def item_opts(parser):
+    return (
+        parser.all_of_group, parser.any_of_group, parser.exactly_one_of_group,
+        parser.most_one_of_group, parser.dynamic_use, parser.atom)
+
+@pytest.mark.parametrize("depvar,expected,kinds",[
+    param("( a/b )", "( a/b )", ["Atom", "AllOfGroup"], id="open"),
+    param(" ( a/b )", " ( a/b )", ["Atom", "AllOfGroup"], id="whitespace"),
+    param("|| ( a/b )", "|| ( a/b )", ["Atom", "AnyOfGroup"], id="pipe"),
+    param("^^ ( a/b )", "^^ ( a/b )", ["Atom", "ExactlyOneOfGroup"], id="caret"),
+    param("?? ( a/b )", "?? ( a/b )", ["Atom", "MostOneOfGroup"], id="question"),
+    param("!u? ( a/b ) !c/d", "!u? ( a/b ) !c/d", ["Atom", "DynamicUse", "Atom"], id="bang"),
+    param("u? ( a/b ) c/d", "u? ( a/b ) c/d", ["Atom", "DynamicUse", "Atom"], id="alnum"),
+    param(">=a/b-1 <c/d-1", ">=a/b-1 <c/d-1", ["Atom", "Atom"], id="gate"),
+    param("=a/b-1 ~c/d-1", "=a/b-1 ~c/d-1", ["Atom", "Atom"], id="eq"),
+    param("_a/b", "_a/b", ["Atom"], id="underscore"),
+    param("a/b ] c/d", "a/b ", ["Atom"], id="stops at unknown character"),
+    param("] a/b", "", [], id="fallback"),
+])
+def test_parser_read_items(parser_factory, depvar, expected, kinds):
+    parser = parser_factory(depvar)
+    parser.read_items(item_opts(parser), {})
+    assert depvar[:parser.idx] == expected
+    assert [p.kind for p in parser.parcels if p.kind in ITEM_KINDS] == kinds
+    # Filtering by the next character reads the same as trying every option. 
+    reference = Parser(depvar)
+    reference.read(item_opts(reference), count_max=None)
+    assert parser.parcels == reference.parcels
+
+def test_parser_first_last_value():
+    parser = Parser("a/b c/d")
+    parser.root()
+    assert parser.first_value("CatPkg") == "a/b"
+    assert parser.last_value("CatPkg") == "c/d"
+    assert parser.first_value("Slot") == ""
+    assert parser.last_value("Slot", None) is None
+
+def test_parser_kinds_interned():
+    # The kind filters rely on parcel kinds being interned. 
+    kinds = []
+    for depvar, rule in [
+        ("!>=a/b-1.0:0/1=[u(+)?] !u? ( || ( c/d e ) ) ^^ ( f/g )", "root"),
+        ("-1.0a_p1-r1", "version"),
+        ("!u?", "use_query"),
+    ]:
+        parser = Parser(depvar)
+        getattr(parser, rule)()
+        kinds.extend(parcel.kind for parcel in parser.parcels)
+    assert len(set(kinds)) > 20
+    for kind in kinds:
+        assert sys.intern(kind) is kind
+
+def test_parse_depvar():
+    depvar = "ssl? ( dev-libs/openssl:0= ) sys-libs/zlib"
+    tree = parse_depvar(depvar)
+    assert tree.data.kind == "Root"
+    assert tree.data.value == depvar
+    x = lambda d: d.kind
+    assert len(tree.traverse_branches(["DynamicUse", 0, "Atom"], x)) == 1
+    assert len(tree.traverse_branches(["Atom"], x)) == 1
+    assert parse_depvar(depvar) is tree
+
+def test_parse_depvars():
+    depvars = ["a/b c/d", "ssl? ( e/f )", "a/b c/d", "|| ( g/h i/j )"]
+    serial = parse_depvars(depvars, jobs=1)
+    pooled = parse_depvars(depvars, jobs=2, chunksize=1)
+    assert list(serial) == ["a/b c/d", "ssl? ( e/f )", "|| ( g/h i/j )"]
+    assert {k: repr(v) for k, v in serial.items()} == {k: repr(v) for k, v in pooled.items()}
+
+def test_parse_depvars_one_worker(monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("process pool started for one worker")
+    monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", no_pool)
+    monkeypatch.setattr(os, "cpu_count", lambda: 1)
+    depvars = [f"a/b{i}" for i in range(200)]
+    assert list(parse_depvars(depvars)) == depvars
+    assert list(parse_depvars(depvars, jobs=4, chunksize=200)) == depvars
+
+def test_main_jobs_validated(monkeypatch, capsys):
+    for jobs in ["0", "-1", "x"]:
+        monkeypatch.setattr(sys, "argv", ["gentoo_rdep_analyzer", "-j", jobs])
+        with pytest.raises(SystemExit):
+            main()
+        assert "--jobs" in capsys.readouterr().err
+
+def test_triggers_examine_dependencies_error(capsys):
+    triggers = Triggers.__new__(Triggers)
+    triggers._atom_pkgname_cache = {}
+    triggers.pkgname = "a/b"
+    triggers.jobs = 1
+    pkgnames = [f"c/d{i}" for i in range(20)]
+    triggers._calc_rdep_levels = lambda pkgname: [
+        (0, pkgname), *((1, p) for p in pkgnames)]
+    called = []
+    def get_depvars(pkgname):
+        called.append(pkgname)
+        if pkgname == "c/d0": raise RuntimeError("portageq failed")
+        # Slow calls give the failure time to cancel the pending ones. 
+        time.sleep(0.05)
+        return [""]
+    triggers._get_depvars = get_depvars
+    with pytest.raises(SystemExit) as excinfo:
+        list(triggers.examine_dependencies())
+    assert excinfo.value.code == 1
+    assert capsys.readouterr().err == "portageq failed\n"
+    assert called[0] == "c/d0"
+    assert len(called) <= 2
+
+def test_triggers_prune_deep_tree():
+    triggers = Triggers.__new__(Triggers)
+    triggers._atom_pkgname_cache = {}
+    root = node = Tree(("Root", ""))
+    for _ in range(sys.getrecursionlimit() * 2):
+        branch = Tree(("AllOfGroup", ""))
+        node.add_branch(Tree(("Pkgname", "c/d")))
+        node.add_branch(branch)
+        node = branch
+    node.add_branch(Tree(("Pkgname", "a/b-1")))
+    assert triggers._prune_trigger_tree(root, "a/b") is root
+    assert len(root.branches) == 1
+    assert triggers._prune_trigger_tree(Tree(("Root", "")), "a/b") == False